@@ -0,0 +1,49 @@
+"""Benchmark for deduce(): squares and pairwise sums of squares of 6 variables
+
+Reports the time, the number of Op instances built and the peak traced memory.
+The persistent cache is disabled, so that deduction itself is measured."""
+
+import io
+import time
+import tracemalloc
+import contextlib
+from itertools import combinations
+from math_objects import *
+from cache import set_cache
+
+set_cache(None)
+with contextlib.redirect_stdout(io.StringIO()): # solution_object runs its example on import
+    from solution_object import Problem, Solution
+
+def count_ops(function):
+    """Calls the function, returns the number of Op instances built meanwhile"""
+    count = 0
+    op_init = Op.__init__
+    def counting_init(self, *args):
+        nonlocal count
+        count += 1
+        op_init(self, *args)
+    Op.__init__ = counting_init
+    try:
+        function()
+    finally:
+        Op.__init__ = op_init
+    return count
+
+def bench(num_vars=6):
+    vars = [Var(name) for name in 'abcdefgh'[:num_vars]]
+    sol = Solution(Problem(Le(0, vars[0]**2 + vars[1]**2)))
+    for var in vars:
+        sol.add_term(var**2)
+    for var1, var2 in combinations(vars, 2):
+        sol.add_term(var1**2 + var2**2)
+    tracemalloc.start()
+    start = time.perf_counter()
+    ops = count_ops(sol.deduce)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"deduce: {elapsed:.3f}s, {ops} Op instances built, {peak / 1024:.0f} KiB peak, {len(sol.facts)} facts")
+
+if __name__ == '__main__':
+    bench()
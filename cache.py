@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import math_objects
+import pattern_match
+import congruence
+import simplify_rules
+import deduction_rules
+from math_objects import *
+
+CACHE_VERSION = 1 # bump when the meaning of cached results changes in a way the sources below do not show
+
+def structural_hash(object: Prop | Term):
+    """Canonical hash, equal for propositions and terms that compare equal"""
+    assert isinstance(object, (Prop, Term)), "structural_hash() takes Prop or Term"
+    return hashlib.sha1(repr(object.key()).encode()).hexdigest()
+
+def _encode(term: Term):
+    """Same shape as Term.key(), but keeps the order of the arguments"""
+    if isinstance(term, Op):
+        return ['Op', term.ftype, [_encode(arg) for arg in term.args]]
+    if isinstance(term, Const):
+        return ['Const', term.value]
+    return [term.__class__.__name__, term.name]
+
+def _decode(data):
+    """Inverse of _encode(), raises ValueError for anything else"""
+    if not isinstance(data, list) or not data:
+        raise ValueError("Malformed term in cache")
+    match data:
+        case ['Const', value] if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return Const(value)
+        case ['Var', str(name)]:
+            return Var(name)
+        case ['Unk', str(name)]:
+            return Unk(name)
+        case ['Unk_Const', str(name)]:
+            return Unk_Const(name)
+        case ['Op', 'Add' | 'Sub' | 'Mul' | 'Div' | 'Pow' | 'Root' as ftype, list(args)]:
+            return Op(ftype, *(_decode(arg) for arg in args))
+    raise ValueError("Malformed term in cache")
+
+def _dumps(term: Term):
+    return json.dumps(_encode(term))
+
+def _loads(text: str):
+    """Inverse of _dumps(), returns None if the text cannot be read back"""
+    try:
+        return _decode(json.loads(text))
+    except (ValueError, TypeError, AssertionError, RecursionError):
+        return None
+
+def _rules_fingerprint():
+    """Cached results are only valid for the code they were computed with"""
+    import simplify, deduction # these import this module
+    modules = (math_objects, pattern_match, congruence, simplify_rules, simplify, deduction_rules, deduction, sys.modules[__name__])
+    source = str(CACHE_VERSION) + ''.join(inspect.getsource(module) for module in modules)
+    return hashlib.sha1(source.encode()).hexdigest()
+
+class PersistentCache:
+    """On-disk cache of simplifications and proved lemmas, shared between runs and processes"""
+
+    def __init__(self, path: str, max_entries=100000):
+        assert isinstance(path, str), "PersistentCache.__init__() takes str for path"
+        assert isinstance(max_entries, int) and max_entries > 0, "max_entries must be a positive int"
+        self.path = path
+        self.max_entries = max_entries
+        self.memory = {} # hash -> simplified Term, for this process only
+        self._connection = None
+        self._pid = None
+        self._puts = 0
+        self._setup()
+
+    def _connect(self):
+        """One connection per process, reopened after a fork"""
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def _setup(self):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            fingerprint = _rules_fingerprint()
+            row = connection.execute("SELECT value FROM meta WHERE name = 'rules'").fetchone()
+            if row is None or row[0] != fingerprint: # the schema may have changed too
+                connection.execute("DROP TABLE IF EXISTS simplify")
+                connection.execute("DROP TABLE IF EXISTS lemmas")
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('rules', ?)", (fingerprint,))
+            connection.execute("CREATE TABLE IF NOT EXISTS simplify (key TEXT PRIMARY KEY, result TEXT NOT NULL, stored REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS lemmas (key TEXT NOT NULL, context TEXT NOT NULL, kind TEXT NOT NULL, "
+                               "lhs TEXT NOT NULL, rhs TEXT NOT NULL, lhs_key TEXT NOT NULL, rhs_key TEXT NOT NULL, "
+                               "provenance TEXT NOT NULL, stored REAL NOT NULL, PRIMARY KEY (key, context))")
+            connection.execute("CREATE INDEX IF NOT EXISTS lemmas_lhs ON lemmas (lhs_key)")
+            connection.execute("CREATE INDEX IF NOT EXISTS lemmas_rhs ON lemmas (rhs_key)")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _evict(self):
+        """Drops the oldest entries of each table once it holds more than max_entries"""
+        self._puts += 1
+        if self._puts % 100:
+            return
+        connection = self._connect()
+        for table in ('simplify', 'lemmas'):
+            count = connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if count > self.max_entries:
+                connection.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY stored LIMIT ?)",
+                                   (count - self.max_entries,))
+
+    def get_simplify(self, term: Term, mode=''):
+        key = structural_hash(term) + mode
+        if key in self.memory:
+            return self.memory[key]
+        try:
+            row = self._connect().execute("SELECT result FROM simplify WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error: # the cache is only an optimization
+            return None
+        result = None if row is None else _loads(row[0])
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put_simplify(self, term: Term, result: Term, mode=''):
+        key = structural_hash(term) + mode
+        self._remember(key, result)
+        try:
+            self._connect().execute("INSERT OR REPLACE INTO simplify VALUES (?, ?, ?)", (key, _dumps(result), time.time()))
+            self._evict()
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key, result):
+        if len(self.memory) >= self.max_entries:
+            self.memory.clear()
+        self.memory[key] = result
+
+    def get_lemma(self, fact: Prop, assumptions: list[Prop]):
+        """Provenance of the fact if it was proved without assumptions or under the same assumptions, otherwise None"""
+        values = (structural_hash(fact), self._context(()), self._context(assumptions))
+        try:
+            row = self._connect().execute("SELECT provenance FROM lemmas WHERE key = ? AND context IN (?, ?) LIMIT 1", values).fetchone()
+        except sqlite3.Error:
+            return None
+        return None if row is None else row[0]
+
+    def get_lemmas(self, terms: list[Term], new_terms: list[Term], assumptions: list[Prop]):
+        """Lemmas proved without assumptions or under the same assumptions, with their provenance,
+        whose sides are constants or terms, at least one of them new"""
+        context = (self._context(()), self._context(assumptions))
+        keys = ['const'] + [structural_hash(term) for term in terms]
+        new_keys = [structural_hash(term) for term in new_terms]
+        if not new_keys:
+            return []
+        places = lambda values: ', '.join('?' * len(values))
+        query = (f"SELECT kind, lhs, rhs, provenance FROM lemmas WHERE context IN (?, ?) "
+                 f"AND lhs_key IN ({places(keys)}) AND rhs_key IN ({places(keys)}) "
+                 f"AND (lhs_key IN ({places(new_keys)}) OR rhs_key IN ({places(new_keys)}))")
+        try:
+            rows = self._connect().execute(query, (*context, *keys, *keys, *new_keys, *new_keys)).fetchall()
+        except sqlite3.Error:
+            return []
+        lemmas = []
+        for kind, lhs, rhs, provenance in rows:
+            lhs, rhs = _loads(lhs), _loads(rhs)
+            if lhs is not None and rhs is not None:
+                lemmas.append(({'Eq': Eq, 'Le': Le}[kind](lhs, rhs), provenance))
+        return lemmas
+
+    def put_lemma(self, fact: Prop, assumptions: list[Prop], provenance: str):
+        assert isinstance(fact, (Eq, Le)), "PersistentCache.put_lemma() takes Eq or Le"
+        side_keys = ['const' if side.isconst() else structural_hash(side) for side in (fact.lhs, fact.rhs)]
+        values = (structural_hash(fact), self._context(assumptions), fact.__class__.__name__,
+                  _dumps(fact.lhs), _dumps(fact.rhs), *side_keys, provenance, time.time())
+        try:
+            self._connect().execute("INSERT OR IGNORE INTO lemmas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+            self._evict()
+        except sqlite3.Error:
+            pass
+
+    def _context(self, assumptions: list[Prop]):
+        return json.dumps(sorted(set(structural_hash(assumption) for assumption in assumptions)))
+
+    def clear(self):
+        self.memory.clear()
+        connection = self._connect()
+        connection.execute("DELETE FROM simplify")
+        connection.execute("DELETE FROM lemmas")
+
+_cache = 0 # not opened yet
+
+def get_cache():
+    """The default cache, at $INEQUALITIES_CACHE or ~/.cache/inequalities; setting the variable to '' disables it"""
+    global _cache
+    if _cache == 0:
+        path = os.environ.get('INEQUALITIES_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'inequalities', 'cache.sqlite3'))
+        _cache = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                _cache = PersistentCache(path)
+            except (OSError, sqlite3.Error):
+                pass
+    return _cache
+
+def set_cache(cache: PersistentCache | None):
+    """Replaces the default cache, None disables caching"""
+    assert cache is None or isinstance(cache, PersistentCache), "set_cache() takes PersistentCache or None"
+    global _cache
+    _cache = cache
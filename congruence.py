@@ -0,0 +1,169 @@
+from math_objects import *
+
+def term_size(term: Term):
+    """Number of nodes in a term"""
+    return sum(1 for _ in term)
+
+class CongruenceClosure:
+    """Union-find over terms, closed under congruence: if X=Y then f(X)=f(Y)"""
+
+    def __init__(self):
+        self.parent = {} # key -> parent key
+        self.terms = {} # key -> Term
+        self.classes = {} # root key -> list of member keys
+        self.signatures = {} # (ftype, argument root keys) -> key of an operation
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, term: Term):
+        return term.key() in self.terms
+
+    def add(self, term: Term):
+        """Registers a term together with all of its subterms"""
+        assert isinstance(term, Term), "CongruenceClosure.add() takes Term"
+        if term.key() in self.terms:
+            return
+        if self._add(term):
+            self._rebuild()
+
+    def _add(self, term: Term):
+        """Registers a term recursively, returns whether it is congruent to an old term"""
+        key = term.key()
+        if key in self.terms:
+            return False
+        congruent = False
+        if isinstance(term, Op):
+            for arg in term.args:
+                congruent = self._add(arg) or congruent
+        self.parent[key] = key
+        self.terms[key] = term
+        self.classes[key] = [key]
+        if isinstance(term, Op):
+            signature = self._signature(term)
+            if signature in self.signatures:
+                congruent = self._union(self.signatures[signature], key) or congruent
+            else:
+                self.signatures[signature] = key
+        return congruent
+
+    def find(self, term: Term):
+        """Returns the key of the representative of the class of a registered term"""
+        key = term.key() if isinstance(term, Term) else term
+        assert key in self.parent, "CongruenceClosure.find() takes a registered term, use lookup() otherwise"
+        root = key
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[key] != root: # path compression
+            self.parent[key], key = root, self.parent[key]
+        return root
+
+    def lookup(self, term: Term, subst=None):
+        """Like find(), but also accepts unregistered terms, returns None if the class is unknown
+
+        With a substitution dictionary, looks up substitute(term, subst) without building it."""
+        if subst and isinstance(term, Unk) and term.name in subst:
+            return self.lookup(subst[term.name])
+        key = term.key()
+        if key in self.parent:
+            return self.find(key)
+        if isinstance(term, Op):
+            arg_roots = [self.lookup(arg, subst) for arg in term.args]
+            if None in arg_roots:
+                return None
+            key = self.signatures.get((term.ftype, tuple(sorted(arg_roots)) if term.ftype_group == 0 else tuple(arg_roots)))
+            return None if key is None else self.find(key)
+        return None
+
+    def equal(self, lhs: Term, rhs: Term):
+        if lhs == rhs:
+            return True
+        root = self.lookup(lhs)
+        return root is not None and root == self.lookup(rhs)
+
+    def equal_props(self, prop: Prop, other: Prop):
+        """Equality of propositions modulo the known equalities"""
+        if prop.__class__ != other.__class__:
+            return False
+        if self.equal(prop.lhs, other.lhs) and self.equal(prop.rhs, other.rhs):
+            return True
+        return isinstance(prop, Eq) and self.equal(prop.lhs, other.rhs) and self.equal(prop.rhs, other.lhs)
+
+    def merge(self, lhs: Term, rhs: Term):
+        """Merges the classes of two terms and restores congruence, returns whether anything changed"""
+        self.add(lhs)
+        self.add(rhs)
+        if not self._union(lhs.key(), rhs.key()):
+            return False
+        self._rebuild()
+        return True
+
+    def _union(self, key1, key2):
+        root1, root2 = self.find(key1), self.find(key2)
+        if root1 == root2:
+            return False
+        if len(self.classes[root1]) < len(self.classes[root2]):
+            root1, root2 = root2, root1
+        self.parent[root2] = root1
+        self.classes[root1] += self.classes.pop(root2)
+        return True
+
+    def _signature(self, term: Op):
+        arg_roots = tuple(self.find(arg.key()) for arg in term.args)
+        if term.ftype_group == 0:
+            arg_roots = tuple(sorted(arg_roots))
+        return (term.ftype, arg_roots)
+
+    def _rebuild(self):
+        """Merges operations whose arguments have become equal, until nothing changes"""
+        changed = True
+        while changed:
+            changed = False
+            self.signatures = {}
+            for key, term in self.terms.items():
+                if not isinstance(term, Op):
+                    continue
+                signature = self._signature(term)
+                if signature in self.signatures:
+                    changed = self._union(self.signatures[signature], key) or changed
+                else:
+                    self.signatures[signature] = key
+
+    def members(self, term: Term):
+        """All registered terms equal to the given term"""
+        root = self.lookup(term)
+        return [term] if root is None else [self.terms[key] for key in self.classes[root]]
+
+    def representative(self, term: Term):
+        """The smallest registered term equal to the given term"""
+        return min(self.members(term), key=lambda t: (term_size(t), str(t)))
+
+    def pairs(self):
+        """All ordered pairs of distinct equal terms, at least one of which contains a variable"""
+        for member_keys in self.classes.values():
+            members = [self.terms[key] for key in member_keys]
+            for lhs in members:
+                for rhs in members:
+                    if lhs is not rhs and (lhs.hasvar() or rhs.hasvar()):
+                        yield lhs, rhs
+
+    def extract(self, term: Term):
+        """The smallest term equal to the given term, built from the representatives of the argument classes"""
+        best = {} # root key -> (size, term)
+        changed = True
+        while changed:
+            changed = False
+            for key, member in self.terms.items():
+                root = self.find(key)
+                if isinstance(member, Op):
+                    arg_roots = [self.find(arg.key()) for arg in member.args]
+                    if not all(arg_root in best for arg_root in arg_roots):
+                        continue
+                    size = 1 + sum(best[arg_root][0] for arg_root in arg_roots)
+                    if root not in best or size < best[root][0]:
+                        best[root] = (size, Op(member.ftype, *(best[arg_root][1] for arg_root in arg_roots)))
+                        changed = True
+                elif root not in best or 1 < best[root][0]:
+                    best[root] = (1, member)
+                    changed = True
+        return best[self.find(term)][1]
@@ -1,58 +1,102 @@
+from itertools import chain
 from math_objects import *
 from pattern_match import pattern_match, substitute
 from simplify import simplify
 from deduction_rules import Deduce, deduction_rules
+from congruence import CongruenceClosure
 
 def deduce(sol, rules=deduction_rules):
-    changed = False
-    for rule_name, rule in rules.items():
-        changed_here = _deduce_once(sol, rule_name, rule)
-        changed = changed or changed_here
-    if changed:
-        deduce(sol, rules)
+    changed = True
+    while changed:
+        changed = False
+        sol.recall_lemmas()
+        for rule_name, rule in rules.items():
+            changed_here = _deduce_once(sol, rule_name, rule)
+            if not changed_here:
+                sol.mark_spent(rule_name)
+            changed = changed or changed_here
+        if len(sol.terms) >= sol.max_terms and sol.spent_changed:
+            sol.collect_garbage()
+        if len(sol.candidates) > sol.max_candidates: # only a memo, so it can be forgotten
+            sol.candidates.clear()
 
 def _deduce_once(sol, rule_name: str, rule: Deduce):
-    substs_matching_assumptions = _assumption_match(sol.facts, rule.assumptions)
+    known_terms = {sol.equalities.find(term): term for term in sol.terms} # class root -> term under consideration
+    statement_unks = set(term.name for term in rule.statement if isinstance(term, Unk))
+    substs_matching_assumptions = _assumption_match(sol.facts, rule.assumptions, sol.equalities)
     for subst_m_a in substs_matching_assumptions:
-        rule_matching_assumptions = substitute(rule.statement, subst_m_a)
-        substs_matching_terms = _term_match(sol.terms, rule_matching_assumptions)
-        for subst_m_t in substs_matching_terms:
-            derived_statement = substitute(rule_matching_assumptions, subst_m_t)
+        for subst in _term_match(sol.terms, rule.statement, subst_m_a, sol.equalities, known_terms):
+            # The substitution determines the candidate, so repeats are skipped before anything is built
+            candidate_key = (rule_name, _subst_key({name: subst[name] for name in statement_unks}))
+            if candidate_key in sol.candidates:
+                continue
+            sol.candidates.add(candidate_key)
+            derived_statement = substitute(rule.statement, subst)
+            lhs = _known_term(known_terms, derived_statement.lhs, sol.equalities)
+            rhs = _known_term(known_terms, derived_statement.rhs, sol.equalities)
+            if lhs is not derived_statement.lhs or rhs is not derived_statement.rhs:
+                derived_statement = derived_statement.__class__(lhs, rhs)
+            if derived_statement.key() in sol.fact_keys: # already known, no need to simplify
+                continue
             derived_statement = derived_statement.__class__(simplify(derived_statement.lhs), simplify(derived_statement.rhs))
-            deduced = sol.add_fact(derived_statement, f"deduced by {rule_name}: {derived_statement}")
+            deduced = sol.add_derived_fact(derived_statement, f"deduced by {rule_name}: {derived_statement}")
             if deduced:
                 return True
     return False
 
-def _term_match(terms: list[Term], statement: Prop):
-    subst_list = [{}]
-    if not statement.lhs.isconst():
-        subst_list = _term_match_side(terms, statement.lhs, subst_list)
-    if not statement.rhs.isconst():
-        subst_list = _term_match_side(terms, statement.rhs, subst_list)
+def _term_match(terms: list[Term], statement: Prop, subst: dict, equalities: CongruenceClosure, known_terms: dict):
+    subst_list = [subst]
+    for side in (statement.lhs, statement.rhs):
+        if not side.isconst():
+            subst_list = _term_match_side(terms, side, subst_list, equalities, known_terms)
     return subst_list
 
-def _term_match_side(terms: list[Term], statement_side: Prop, subst_list: list[dict]):
+def _term_match_side(terms: list[Term], statement_side: Term, subst_list: list[dict], equalities: CongruenceClosure, known_terms: dict):
+    """Only one term per class is kept, so patterns are matched against every member of its class
+
+    Sides fully determined by the substitution are looked up in the classes without being built."""
+    unks = [term for term in statement_side if isinstance(term, Unk)]
     new_subst_list = []
+    seen = set()
     for subst in subst_list:
+        if all(unk.name in subst for unk in unks):
+            if statement_side.hasvar() or any(subst[unk.name].hasvar() for unk in unks):
+                if equalities.lookup(statement_side, subst) not in known_terms:
+                    continue
+            new_subst_list.append(subst)
+            continue
         for term in terms:
-            new_subst = pattern_match(term, statement_side, subst)
-            if (new_subst is not None) and (new_subst not in new_subst_list):
-                new_subst_list.append(new_subst)
+            for member in equalities.members(term):
+                new_subst = pattern_match(member, statement_side, subst)
+                if new_subst is not None and _subst_key(new_subst) not in seen:
+                    seen.add(_subst_key(new_subst))
+                    new_subst_list.append(new_subst)
     return new_subst_list
 
-def _assumption_match(facts: list[Prop], assumptions: list[Prop]):
+def _subst_key(subst: dict):
+    return frozenset((name, term.key()) for name, term in subst.items())
+
+def _known_term(known_terms: dict, term: Term, equalities: CongruenceClosure):
+    """Replaces the term by the equal term under consideration, if there is one"""
+    return known_terms.get(equalities.lookup(term), term)
+
+def _assumption_match(facts: list[Prop], assumptions: list[Prop], equalities: CongruenceClosure):
+    """Equality assumptions are matched against the equivalence classes, once per ordered pair of equal terms
+
+    Inequality assumptions are matched against these pairs too, since X=Y replaces the facts X<=Y and Y<=X."""
     subst_list = [{}]
     for assumption in assumptions:
         new_subst_list = []
+        seen = set()
         for subst in subst_list:
-            for fact in facts:
-                new_subst = pattern_match(fact, assumption, subst)
-                if new_subst is not None:
+            if isinstance(assumption, Eq):
+                candidates = equalities.pairs()
+            else:
+                candidates = chain(((fact.lhs, fact.rhs) for fact in facts if isinstance(fact, Le)), equalities.pairs())
+            for lhs, rhs in candidates:
+                new_subst = pattern_match(rhs, assumption.rhs, pattern_match(lhs, assumption.lhs, subst))
+                if new_subst is not None and _subst_key(new_subst) not in seen:
+                    seen.add(_subst_key(new_subst))
                     new_subst_list.append(new_subst)
-                if isinstance(fact, Eq):
-                    new_subst = pattern_match(fact.rev(), assumption, subst)
-                    if new_subst is not None:
-                        new_subst_list.append(new_subst)
         subst_list = new_subst_list
     return subst_list
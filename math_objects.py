@@ -49,12 +49,23 @@ class Term:
             for arg in self.args:
                 yield from iter(arg)
 
+    def __hash__(self):
+        return hash(self.key())
+
+    def key(self):
+        """Canonical structural key, equal for terms that compare equal"""
+        raise NotImplementedError
+
     def isconst(self):
-        return not any(isinstance(term, (Var, Unk)) for term in self)
+        return not (self.hasvar() or self.hasunk())
     def hasvar(self):
-        return any(isinstance(term, Var) for term in self)
+        if not hasattr(self, '_hasvar'): # terms are never mutated, so this is computed once
+            self._hasvar = isinstance(self, Var) or (isinstance(self, Op) and any(arg.hasvar() for arg in self.args))
+        return self._hasvar
     def hasunk(self):
-        return any(isinstance(term, Unk) for term in self)
+        if not hasattr(self, '_hasunk'): # terms are never mutated, so this is computed once
+            self._hasunk = isinstance(self, Unk) or (isinstance(self, Op) and any(arg.hasunk() for arg in self.args))
+        return self._hasunk
 
     def isinstance_add(self):
         return isinstance(self, Op) and self.ftype == 'Add'
@@ -94,6 +105,12 @@ class Const(Term):
     
     def __eq__(self, other):
         return isinstance(other, Const) and self.value == other.value
+    __hash__ = Term.__hash__
+
+    def key(self):
+        if isinstance(self.value, float) and self.value.is_integer(): # Const(2.0) == Const(2)
+            return ('Const', int(self.value))
+        return ('Const', self.value)
     
     def __lt__(self, other):
         if not isinstance(other, Const):
@@ -119,6 +136,10 @@ class Var(Term):
     
     def __eq__(self, other):
         return isinstance(other, Var) and self.name == other.name
+    __hash__ = Term.__hash__
+
+    def key(self):
+        return ('Var', self.name)
     
     def __lt__(self, other):
         if not isinstance(other, Var):
@@ -141,6 +162,10 @@ class Unk(Term):
     
     def __eq__(self, other):
         return isinstance(other, self.__class__) and self.name == other.name
+    __hash__ = Term.__hash__
+
+    def key(self):
+        return (self.__class__.__name__, self.name)
 
 class Unk_Const(Unk):
     """Unknown place holders for constants"""
@@ -202,6 +227,15 @@ class Op(Term):
             return all(self.args.count(arg) == other.args.count(arg) for arg in self.args + other.args)
         else:
             return self.args == other.args
+    __hash__ = Term.__hash__
+
+    def key(self):
+        if not hasattr(self, '_key'): # args are never mutated, so the key is computed once
+            arg_keys = tuple(arg.key() for arg in self.args)
+            if self.ftype_group == 0:
+                arg_keys = tuple(sorted(arg_keys))
+            self._key = ('Op', self.ftype, arg_keys)
+        return self._key
 
 def _wrap(x):
     """This allows easy typing of constants and variables"""
@@ -249,18 +283,27 @@ class Prop:
         if isinstance(self, Le):
             return (self.lhs, self.rhs) == (other.lhs, other.rhs)
 
+    def __hash__(self):
+        return hash(self.key())
+
     def __iter__(self):
         yield from iter(self.lhs)
         yield from iter(self.rhs)
+
+    def key(self):
+        """Canonical structural key, equal for propositions that compare equal"""
+        if isinstance(self, Eq):
+            return ('Eq', tuple(sorted((self.lhs.key(), self.rhs.key()))))
+        return (self.__class__.__name__, self.lhs.key(), self.rhs.key())
     
     # def isrefl(self):
     #     return self.lhs == self.rhs
     # def isconst(self):
     #     return not any(isinstance(term, (Var, Unk)) for term in self)
     def hasvar(self):
-        return any(isinstance(term, Var) for term in self)
+        return self.lhs.hasvar() or self.rhs.hasvar()
     def hasunk(self):
-        return any(isinstance(term, Unk) for term in self)
+        return self.lhs.hasunk() or self.rhs.hasunk()
 
 class Eq(Prop):
     """Equality (=) propositions"""
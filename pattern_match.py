@@ -71,14 +71,22 @@ def _pattern_match_term(term: Term, pattern: Term | FunctionType, subst):
     return None
 
 def substitute(object: Prop | Term, subst):
-    """Substitutes the Unk instances in propositions and terms according to a dictionary"""
+    """Substitutes the Unk instances in propositions and terms according to a dictionary
+
+    Subtrees that do not change are shared with the original object instead of being rebuilt."""
 
     if isinstance(object, Prop):
-        return object.__class__(substitute(object.lhs, subst), substitute(object.rhs, subst))
-    if subst == {}:
+        lhs, rhs = substitute(object.lhs, subst), substitute(object.rhs, subst)
+        if lhs is object.lhs and rhs is object.rhs:
+            return object
+        return object.__class__(lhs, rhs)
+    if subst == {} or not object.hasunk():
         return object
     if isinstance(object, Unk) and object.name in subst:
         return subst[object.name]
     if isinstance(object, Op):
-        return Op(object.ftype, *(substitute(arg, subst) for arg in object.args))
+        args = tuple(substitute(arg, subst) for arg in object.args)
+        if all(new_arg is arg for new_arg, arg in zip(args, object.args)):
+            return object
+        return Op(object.ftype, *args)
     return object
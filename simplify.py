@@ -2,6 +2,8 @@ from types import FunctionType
 from math_objects import *
 from pattern_match import pattern_match, substitute
 from simplify_rules import Simplify
+from congruence import CongruenceClosure
+from cache import get_cache
 
 def simplify_by_rules(term, rules):
     """Apply a list of rules repeatedly until no more change"""
@@ -16,16 +18,9 @@ def simplify_by_rules(term, rules):
 def _simplify_by_rules_once(term, rules):
     """Apply a list of rules until the first change"""
     for rule in rules:
-        subst = pattern_match(term, rule.pattern)
-        if subst is not None:
-            if isinstance(rule.result, Term):
-                return substitute(rule.result, subst), True
-            elif isinstance(rule.result, FunctionType):
-                return substitute(rule.result(term), subst), True
-            elif isinstance(rule.result, Exception):
-                raise rule.result
-            else:
-                raise TypeError
+        result = _apply_rule(term, rule)
+        if result is not None:
+            return result, True
     if isinstance(term, Op):
         arg_return = tuple(_simplify_by_rules_once(arg, rules) for arg in term.args)
         arg_return_args = tuple(arg for arg, _ in arg_return)
@@ -33,6 +28,55 @@ def _simplify_by_rules_once(term, rules):
         return Op(term.ftype, *arg_return_args), arg_return_bool
     return term, False
 
+def _apply_rule(term, rule):
+    """Apply a rule at the root of the term, returns None if the rule does not match"""
+    subst = pattern_match(term, rule.pattern)
+    if subst is None:
+        return None
+    if isinstance(rule.result, Term):
+        return substitute(rule.result, subst)
+    elif isinstance(rule.result, FunctionType):
+        return substitute(rule.result(term), subst)
+    elif isinstance(rule.result, Exception):
+        raise rule.result
+    else:
+        raise TypeError
+
+def saturate_by_rules(term, rules, max_iter=10, max_terms=1000):
+    """Equality saturation: apply all rules everywhere, keeping every form, then extract the smallest one"""
+    if isinstance(rules, Simplify):
+        return saturate_by_rules(term, [rules], max_iter, max_terms)
+    assert isinstance(term, Term) and isinstance(rules, (tuple, list)) and all(isinstance(rule, Simplify) for rule in rules), "saturate_by_rules(term, rules) takes term:Term and rules:list[Rule]"
+    egraph = CongruenceClosure()
+    egraph.add(term)
+    for _ in range(max_iter):
+        changed = False
+        for member in list(egraph.terms.values()):
+            if isinstance(member, Op): # rules match syntactically, so also try the arguments in their smallest known form
+                changed = egraph.merge(member, Op(member.ftype, *(egraph.representative(arg) for arg in member.args))) or changed
+            for rule in rules:
+                try:
+                    result = _apply_rule(member, rule)
+                except Exception: # skip the rewrite, the final simplification raises if the extracted term still needs it
+                    continue
+                if result is not None:
+                    changed = egraph.merge(member, result) or changed
+        if not changed or len(egraph) > max_terms:
+            break
+    return simplify_by_rules(egraph.extract(term), rules) # extraction only compares sizes, so finish in normal form
+
 from simplify_rules import simplify_rules_all
-def simplify(term):
-    return simplify_by_rules(term, simplify_rules_all)
+def simplify(term, saturate=False):
+    cache = get_cache()
+    mode = ':saturate' if saturate else ''
+    if cache is not None:
+        result = cache.get_simplify(term, mode)
+        if result is not None:
+            return result
+    if saturate:
+        result = saturate_by_rules(term, simplify_rules_all)
+    else:
+        result = simplify_by_rules(term, simplify_rules_all)
+    if cache is not None:
+        cache.put_simplify(term, result, mode)
+    return result
@@ -1,5 +1,9 @@
 from math_objects import *
 from deduction import deduce
+from deduction_rules import deduction_rules
+from congruence import CongruenceClosure
+from subsumption import istrivial, implies, isusable
+from cache import get_cache
 
 class Problem:
     """Problem statement"""
@@ -29,17 +33,34 @@ class Problem:
 class Solution:
     """Solution for a problem"""
 
-    def __init__(self, problem: Problem):
+    def __init__(self, problem: Problem, rules=deduction_rules, max_terms=1000, max_candidates=100000):
         assert isinstance(problem, Problem), "Solution.__init__() takes Problem"
+        self.rules = rules
+        self.max_terms = max_terms # bounds the derived terms only: terms added with add_term() may exceed it
+        self.max_candidates = max_candidates
         self.vars = problem.vars
         self.goals = [problem.goal]
+        self.assumptions = problem.assumptions
         self.facts = list(problem.assumptions)
-        self.terms = list(self.vars)
+        self.fact_keys = set(fact.key() for fact in self.facts)
+        self.provenance = {} # derived fact -> message
+        self.asserted = [] # facts added with add_fact(), which derived facts may depend on
+        self.recalled = set() # keys of the terms whose cached lemmas were already looked up
+        self.candidates = set() # keys of the unsimplified statements already tried by deduce()
+        self.terms = []
+        self.term_roots = set() # class roots of the terms, to test for an equal term under consideration
+        self.pinned = set() # keys of the terms added explicitly, which are never evicted
+        self.spent = {} # term key -> names of the rules whose matches on the term are complete
+        self.spent_changed = False # whether collect_garbage() may find something new to evict
+        self.equalities = CongruenceClosure()
+        for fact in self.facts:
+            if isinstance(fact, Eq):
+                self.equalities.merge(fact.lhs, fact.rhs)
+        for var in self.vars:
+            self.add_term(var)
         for lhs, rhs in [(prop.lhs, prop.rhs) for prop in self.facts + self.goals]:
-            if lhs.hasvar() and (lhs not in self.terms):
-                self.terms.append(lhs)
-            if rhs.hasvar() and (rhs not in self.terms):
-                self.terms.append(rhs)
+            self.add_term(lhs)
+            self.add_term(rhs)
         self.history = [
             f"we will prove for all {', '.join(str(var) for var in self.vars)}:",
             str(self.goals[0]),
@@ -76,23 +97,121 @@ class Solution:
                     self.history.append(msg)
 
     def add_term(self, term: Term, message=''):
+        """Adds a term, unless an equal term is already under consideration, and keeps it for good"""
         assert isinstance(term, Term), "Solution.add_term() takes Term"
-        if term.hasvar() and (term not in self.terms):
+        self.pinned.add(term.key())
+        return self._add_term(term, message)
+
+    def _add_term(self, term: Term, message=''):
+        if term.hasvar() and self.equalities.lookup(term) not in self.term_roots:
+            self.equalities.add(term)
             self.terms.append(term)
+            self.term_roots.add(self.equalities.find(term))
             self.add_history(message)
             return True
         return False
+
+    def _add_derived_term(self, term: Term):
+        """Adds a side of a derived fact if a rule can use it, within the max_terms bound"""
+        if not isusable(term, self.rules.values()):
+            return False
+        if len(self.terms) >= self.max_terms and self.spent_changed:
+            self.collect_garbage()
+        if len(self.terms) >= self.max_terms:
+            return False
+        return self._add_term(term)
+
+    def has_fact(self, fact: Prop):
+        """Whether the fact is trivial or implied by a known fact, modulo the known equalities"""
+        if istrivial(fact, self.equalities):
+            return True
+        return any(implies(old_fact, fact, self.equalities) for old_fact in self.facts)
     
     def add_fact(self, fact: Prop, message=''):
-        assert isinstance(fact, Prop), "Solution.add_fact() takes Prop"
-        if fact.hasvar() and (fact not in self.facts):
+        """Asserts a fact without proof, so it becomes part of the context of the lemmas cached afterwards"""
+        if self.add_derived_fact(fact, message):
+            self.asserted.append(fact)
+            return True
+        return False
+
+    def add_derived_fact(self, fact: Prop, message=''):
+        """Adds a new fact in place of the facts it implies, and its sides as terms if a rule can use them"""
+        assert isinstance(fact, Prop), "Solution.add_derived_fact() takes Prop"
+        if fact.key() in self.fact_keys: # cheap exact check before the subsumption check
+            return False
+        if fact.hasvar() and not self.has_fact(fact):
+            for old_fact in [old_fact for old_fact in self.facts if implies(fact, old_fact, self.equalities)]:
+                self.facts.remove(old_fact)
+                self.fact_keys.discard(old_fact.key())
+                self.provenance.pop(old_fact, None)
             self.facts.append(fact)
-            self.add_term(fact.lhs)
-            self.add_term(fact.rhs)
+            self.fact_keys.add(fact.key())
+            self.provenance[fact] = message
+            if isinstance(fact, Eq):
+                self.equalities.merge(fact.lhs, fact.rhs)
+                self._merge_terms()
+                self.spent = {} # classes have new members to match
+            for side in (fact.lhs, fact.rhs):
+                self._add_derived_term(side)
             self.add_history(message)
             return True
         return False
 
+    def _merge_terms(self):
+        """Keeps only the first term of each equivalence class, pinned if any of the class was"""
+        kept = {} # root -> term
+        for term in self.terms:
+            root = self.equalities.find(term)
+            if root not in kept:
+                kept[root] = term
+            elif term.key() in self.pinned:
+                self.pinned.add(kept[root].key())
+        self.terms = list(kept.values())
+        self.term_roots = set(kept)
+
+    def mark_spent(self, rule_name: str):
+        """Called by deduce() after a pass of the rule over all terms added nothing
+
+        Only rules without assumptions whose statement has a single side to match can be complete for a term:
+        the facts that other rules can use, or the terms they can pair it with, may still change."""
+        rule = self.rules[rule_name]
+        if rule.assumptions or rule.statement.lhs.isconst() == rule.statement.rhs.isconst():
+            return
+        for term in self.terms:
+            spent = self.spent.setdefault(term.key(), set())
+            if rule_name not in spent:
+                spent.add(rule_name)
+                self.spent_changed = True
+
+    def _isevictable(self, term: Term):
+        if term.key() in self.pinned:
+            return False
+        members = self.equalities.members(term)
+        spent = self.spent.get(term.key(), set())
+        return not any(isusable(member, [rule]) for rule_name, rule in self.rules.items() if rule_name not in spent for member in members)
+
+    def collect_garbage(self):
+        """Evicts the terms that no rule can use anymore, and forgets the classes of evicted terms
+
+        Terms added with add_term(), including the variables and the sides of the problem, are never evicted.
+        deduce() calls this whenever the max_terms bound is reached, and once more at its fixed point. Only spent
+        terms can be evicted, so nothing is done unless some became spent since the last collection."""
+        if not self.spent_changed:
+            return
+        self.spent_changed = False
+        terms = [term for term in self.terms if not self._isevictable(term)]
+        if len(terms) == len(self.terms):
+            return
+        self.terms = terms
+        self.spent = {term.key(): self.spent[term.key()] for term in self.terms if term.key() in self.spent}
+        self.equalities = CongruenceClosure()
+        for fact in self.facts:
+            if isinstance(fact, Eq):
+                self.equalities.merge(fact.lhs, fact.rhs)
+        for term in self.terms:
+            self.equalities.add(term)
+        self.term_roots = set(self.equalities.find(term) for term in self.terms)
+
     def add_goal(self, goal: Le, message=''):
         assert isinstance(goal, Le), "Solution.add_goal() takes Le"
         if goal not in self.goals:
@@ -105,12 +224,42 @@ class Solution:
     
     def issolved(self):
         for goal in self.goals:
-            if goal in self.facts:
+            if self.has_fact(goal):
                 return True
         return False
 
     def deduce(self):
-        deduce(self)
+        """Deduces new facts, unless an earlier run already proved a goal in the same context"""
+        cache = get_cache()
+        if cache is not None and not self.issolved():
+            for goal in self.goals:
+                provenance = cache.get_lemma(goal, self.context())
+                if provenance is not None:
+                    self.add_derived_fact(goal, f"recalled from cache, {provenance}")
+                    return
+        deduce(self, self.rules)
+        if self.spent_changed:
+            self.collect_garbage()
+        if cache is not None:
+            for fact, provenance in self.provenance.items():
+                if fact not in self.asserted:
+                    cache.put_lemma(fact, self.context(), provenance)
+
+    def recall_lemmas(self):
+        """Adds the cached lemmas of the same or an empty context whose sides are constants or current terms
+
+        Called by deduce() as terms appear, so the lookups stay bounded by the terms under consideration."""
+        cache = get_cache()
+        if cache is None:
+            return
+        new_terms = [term for term in self.terms if term.key() not in self.recalled]
+        for lemma, provenance in cache.get_lemmas(self.terms, new_terms, self.context()):
+            self.add_derived_fact(lemma, f"recalled from cache, {provenance}")
+        self.recalled.update(term.key() for term in new_terms)
+
+    def context(self):
+        """What the derived facts may depend on: the assumptions of the problem and the asserted facts"""
+        return tuple(self.assumptions) + tuple(self.asserted)
 
 s1 = Solution(Problem(Le(0, Var('a')**2 + Var('b')**2)))
 s1.deduce()
@@ -0,0 +1,29 @@
+from math_objects import *
+from pattern_match import pattern_match
+from congruence import CongruenceClosure
+
+def istrivial(fact: Prop, equalities: CongruenceClosure):
+    """Facts of the form X=X or X<=X, modulo the known equalities"""
+    return equalities.equal(fact.lhs, fact.rhs)
+
+def implies(strong: Prop, weak: Prop, equalities: CongruenceClosure):
+    """Whether the weak fact follows from the strong one by itself, modulo the known equalities"""
+    if equalities.equal_props(strong, weak):
+        return True
+    if isinstance(strong, Eq) and isinstance(weak, Le):
+        return equalities.equal_props(strong, Eq(weak.lhs, weak.rhs))
+    if isinstance(strong, Le) and isinstance(weak, Le):
+        # c1<=X implies c2<=X for c2<=c1, and X<=c1 implies X<=c2 for c1<=c2
+        if isinstance(strong.lhs, Const) and isinstance(weak.lhs, Const) and equalities.equal(strong.rhs, weak.rhs):
+            return weak.lhs.value <= strong.lhs.value
+        if isinstance(strong.rhs, Const) and isinstance(weak.rhs, Const) and equalities.equal(strong.lhs, weak.lhs):
+            return strong.rhs.value <= weak.rhs.value
+    return False
+
+def isusable(term: Term, rules):
+    """Whether the term can match a side of the statement of one of the rules"""
+    for rule in rules:
+        for side in (rule.statement.lhs, rule.statement.rhs):
+            if not side.isconst() and pattern_match(term, side) is not None:
+                return True
+    return False
@@ -0,0 +1,141 @@
+import os
+import sys
+import sqlite3
+import subprocess
+import cache
+from cache import PersistentCache, structural_hash, set_cache, _dumps, _loads
+from math_objects import *
+from simplify import simplify
+
+set_cache(None) # importing solution_object runs its example, which must not touch the default cache
+from solution_object import Problem, Solution
+
+a, b = Var('a'), Var('b')
+
+def count(path, table):
+    return sqlite3.connect(path).execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def test_structural_hash():
+    assert structural_hash(a + b) == structural_hash(b + a)
+    assert structural_hash(Const(2.0)) == structural_hash(Const(2))
+    assert structural_hash(a - b) != structural_hash(b - a)
+    assert structural_hash(Eq(a, b)) == structural_hash(Eq(b, a))
+    assert structural_hash(Le(a, b)) != structural_hash(Le(b, a))
+
+def test_round_trip():
+    for term in (Const(3), Const(-1.5), a, Unk('X'), Unk_Const('C'), Root(a ** 2 + 1, 3) / (b - 2), Add(), Mul(a)):
+        loaded = _loads(_dumps(term))
+        assert loaded == term and repr(loaded) == repr(term)
+
+def test_loads_rejects_code():
+    assert _loads("__import__('os').system('true')") is None
+    assert _loads('["Op", "Exec", []]') is None
+    assert _loads('["Var", "1a"]') is None
+
+def test_simplify_is_cached_across_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    set_cache(PersistentCache(path))
+    try:
+        assert simplify(a + a) == 2 * a
+        set_cache(PersistentCache(path))
+        assert cache.get_cache().get_simplify(a + a) == 2 * a
+        assert simplify(a + a) == 2 * a
+    finally:
+        set_cache(None)
+
+def test_lemmas_are_recalled_on_demand(tmp_path):
+    set_cache(PersistentCache(str(tmp_path / 'cache.sqlite3')))
+    try:
+        sol = Solution(Problem(Le(0, a ** 2 + b ** 2)))
+        sol.add_term(a ** 2)
+        sol.add_term(b ** 2)
+        sol.deduce()
+        assert sol.issolved()
+        sol = Solution(Problem(Le(0, a ** 2 + b ** 2)))
+        sol.deduce()
+        assert sol.issolved() and sol.history[-1].startswith("recalled from cache")
+        sol = Solution(Problem(Le(a, a + b)))
+        assert Le(0, a ** 2) not in sol.facts # unrelated lemmas are not loaded
+        sol = Solution(Problem(Le(0, a ** 2 + b ** 2), Le(a, b)))
+        assert cache.get_cache().get_lemma(sol.goals[0], sol.assumptions) is not None # proved without assumptions
+        assert cache.get_cache().get_lemma(Le(0, a), ()) is None
+    finally:
+        set_cache(None)
+
+def test_eviction(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    c = PersistentCache(path, max_entries=50)
+    for i in range(300):
+        c.put_simplify(a + i, Const(i))
+    assert count(path, 'simplify') == 50
+    c.memory.clear()
+    assert c.get_simplify(a + 299) == Const(299)
+    assert c.get_simplify(a + 0) is None
+
+def test_fingerprint_change_resets(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite3')
+    PersistentCache(path).put_simplify(a + a, 2 * a)
+    PersistentCache(path)
+    assert count(path, 'simplify') == 1
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + 1)
+    PersistentCache(path)
+    assert count(path, 'simplify') == 0
+
+WORKER = """
+import sys
+from cache import PersistentCache
+from math_objects import *
+c = PersistentCache(sys.argv[1])
+for i in range(200):
+    term = Var('a') + int(sys.argv[2]) * 1000 + i
+    c.put_simplify(term, Const(i))
+    c.memory.clear()
+    assert c.get_simplify(term) == Const(i)
+"""
+
+def test_concurrent_processes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    PersistentCache(path)
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER, path, str(n)], cwd=os.path.dirname(os.path.abspath(__file__)))
+               for n in range(4)]
+    assert all(worker.wait() == 0 for worker in workers)
+    assert count(path, 'simplify') == 800
+
+def test_asserted_facts_are_not_cached_as_lemmas(tmp_path):
+    c = Var('c')
+    set_cache(PersistentCache(str(tmp_path / 'cache.sqlite3')))
+    try:
+        for fact in (Le(c, c ** 2), Le(a ** 2, -1)):
+            sol = Solution(Problem(fact))
+            sol.add_fact(fact)
+            sol.deduce()
+            sol = Solution(Problem(fact))
+            sol.deduce()
+            assert not sol.issolved()
+        # facts derived from asserted facts are only recalled in a context with the same asserted facts
+        sol = Solution(Problem(Le(2, c ** 2 + c)))
+        sol.add_fact(Le(1, c))
+        sol.add_fact(Le(1, c ** 2))
+        sol.deduce()
+        assert sol.issolved()
+        assert cache.get_cache().get_lemma(sol.goals[0], sol.context()) is not None
+        assert cache.get_cache().get_lemma(sol.goals[0], sol.assumptions) is None
+    finally:
+        set_cache(None)
+
+def test_intermediate_lemmas_are_recalled(tmp_path):
+    set_cache(PersistentCache(str(tmp_path / 'cache.sqlite3')))
+    try:
+        sol = Solution(Problem(Le(0, a ** 2 + b ** 2)))
+        sol.add_term(a ** 2)
+        sol.add_term(b ** 2)
+        sol.deduce()
+        sol = Solution(Problem(Le(-1, a ** 2 + b ** 2 + 1)))
+        sol.add_term(a ** 2 + b ** 2)
+        sol.deduce()
+        assert any(line == "recalled from cache, deduced by add_ineqs: 0<=a^2+b^2" for line in sol.history)
+        sol = Solution(Problem(Le(a, a + b)))
+        sol.deduce()
+        assert not any(line.startswith("recalled from cache") for line in sol.history) # no side is a term here
+    finally:
+        set_cache(None)
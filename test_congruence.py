@@ -0,0 +1,64 @@
+import pytest
+from math_objects import *
+from congruence import CongruenceClosure
+from cache import set_cache
+from simplify import simplify
+
+set_cache(None) # importing solution_object runs its example, which must not touch the default cache
+from solution_object import Problem, Solution
+
+a, b, c = Var('a'), Var('b'), Var('c')
+X, Y = Unk('X'), Unk('Y')
+
+def test_merge_propagates_congruence():
+    egraph = CongruenceClosure()
+    egraph.add(a * c + b)
+    egraph.add(b * c + a)
+    assert not egraph.equal(a * c, b * c)
+    assert egraph.merge(a, b)
+    assert egraph.equal(a * c, b * c)
+    assert egraph.equal(a * c + b, b * c + a)
+    assert not egraph.merge(b, a)
+
+def test_lookup():
+    egraph = CongruenceClosure()
+    egraph.add(a ** 2 + b)
+    egraph.merge(a, c)
+    assert egraph.lookup(c ** 2 + b) == egraph.find(a ** 2 + b) # unregistered, found through its arguments
+    assert egraph.lookup(X ** 2 + Y, {'X': c, 'Y': b}) == egraph.find(a ** 2 + b)
+    assert egraph.lookup(X ** 2 + Y, {'X': b, 'Y': b}) is None
+    assert egraph.lookup(a ** 3) is None
+
+def test_pairs():
+    egraph = CongruenceClosure()
+    egraph.merge(a * 2, Const(3))
+    egraph.add(b)
+    assert sorted((str(lhs), str(rhs)) for lhs, rhs in egraph.pairs()) == [('3', 'a*2'), ('a*2', '3')]
+
+def test_representative_and_extract():
+    egraph = CongruenceClosure()
+    egraph.merge(a + 0, a)
+    egraph.merge((a + 0) * b, Mul(b, a + 0))
+    assert egraph.representative(a + 0) == a
+    assert egraph.extract((a + 0) * b) == a * b
+    assert sorted(str(term) for term in egraph.members(a)) == ['a', 'a+0']
+
+@pytest.mark.parametrize('term', [a + a, (a - b) - c, Pow(a, 1) + 0, (a + b) * 1 - (b + a), Const(2.0), 0 * (1 / (a - a)), (a - a) ** 0 * 0])
+def test_saturation_is_at_least_as_simple(term):
+    normal = simplify(term)
+    saturated = simplify(term, saturate=True)
+    assert sum(1 for _ in saturated) <= sum(1 for _ in normal)
+
+def test_saturation_matches_normal_mode():
+    assert simplify(a + a, saturate=True) == 2 * a
+    assert simplify((a + b) * 1 - (b + a), saturate=True) == Const(0)
+    assert repr(simplify(Const(2.0), saturate=True)) == 'Const(2)'
+
+def test_saturation_raises_when_needed():
+    with pytest.raises(Exception, match="X/0 encountered"):
+        simplify(a / 0, saturate=True)
+
+def test_rules_fire_through_class_members():
+    sol = Solution(Problem(Le(0, a ** 2 + b), Eq(b, a ** 2)))
+    sol.deduce() # square_is_positive matches a^2, kept as b
+    assert sol.issolved()
@@ -0,0 +1,39 @@
+from math_objects import *
+from pattern_match import pattern_match, substitute
+from bench_deduce import count_ops # disables the persistent cache
+from solution_object import Problem, Solution
+
+a, b, c = Var('a'), Var('b'), Var('c')
+X, Y = Unk('X'), Unk('Y')
+
+def test_substitute():
+    assert substitute(X + Y ** 2, {'X': a, 'Y': b}) == a + b ** 2
+    assert substitute(Le(X, Y), {'X': a}) == Le(a, Y)
+
+def test_substitute_shares_unchanged_subtrees():
+    unchanged = (a + b) ** 2
+    term = Add(unchanged, Mul(X, c))
+    result = substitute(term, {'X': a})
+    assert result.args[0] is unchanged and result.args[1].args[1] is c
+    assert substitute(unchanged, {'X': a}) is unchanged
+    prop = Le(0, unchanged)
+    assert substitute(prop, {'X': a}) is prop
+
+def test_substitute_builds_only_the_changed_path():
+    term = Add((a + b) ** 2, (b + c) ** 2, Mul(X, c))
+    assert count_ops(lambda: substitute(term, {'X': a})) == 2 # the new Mul and the new Add
+
+def test_pattern_match():
+    assert pattern_match(a ** 2, X ** 2) == {'X': a}
+    assert pattern_match(Le(a, b), Le(X, X)) is None
+
+def test_deduce_allocations():
+    vars = [Var(name) for name in 'abcdef']
+    sol = Solution(Problem(Le(0, a ** 2 + b ** 2)))
+    for var in vars:
+        sol.add_term(var ** 2)
+    for var1 in vars:
+        for var2 in vars[vars.index(var1) + 1:]:
+            sol.add_term(var1 ** 2 + var2 ** 2)
+    assert count_ops(sol.deduce) < 500 # before structural sharing and key lookups: about 3000
+    assert sol.issolved()
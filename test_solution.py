@@ -0,0 +1,69 @@
+from math_objects import *
+from cache import set_cache
+from deduction_rules import Deduce, deduction_rules
+
+set_cache(None) # importing solution_object runs its example, which must not touch the default cache
+from solution_object import Problem, Solution
+
+a, b, c = Var('a'), Var('b'), Var('c')
+X, Y = Unk('X'), Unk('Y')
+
+def test_subsumed_facts():
+    sol = Solution(Problem(Le(0, a ** 2 + b ** 2)))
+    assert not sol.add_fact(Le(a, a))
+    assert sol.add_fact(Le(0, a ** 2))
+    assert not sol.add_fact(Le(-1, a ** 2))
+    assert sol.add_fact(Le(1, a ** 2))
+    assert sol.facts == [Le(1, a ** 2)]
+    assert sol.add_fact(Eq(a, b))
+    assert not sol.add_fact(Le(b, a))
+
+def test_equalities_replace_inequalities_for_rules():
+    d = Var('d')
+    sol = Solution(Problem(Le(a + c, b + d), Le(a, b), Le(c, d)))
+    sol.add_fact(Eq(a, b))
+    assert Le(a, b) not in sol.facts
+    sol.deduce()
+    assert sol.issolved() # add_ineqs still uses a<=b, through a=b
+
+def test_user_terms_are_kept():
+    sol = Solution(Problem(Le(0, a ** 2 + b ** 2)))
+    sol.add_term(a ** 2)
+    sol.add_term(b ** 2)
+    sol.deduce()
+    assert sol.issolved()
+    assert a ** 2 in sol.terms and b ** 2 in sol.terms
+
+def test_spent_terms_are_evicted():
+    sol = Solution(Problem(Le(0, a ** 2 + c)))
+    sol.add_fact(Le(c, c ** 2))
+    assert c ** 2 in sol.terms
+    sol.deduce()
+    assert Le(0, c ** 2) in sol.facts
+    assert c ** 2 not in sol.terms # derived, and only square_is_positive could use it
+
+def test_pairing_rules_keep_terms():
+    rules = {**deduction_rules, 'add_square': Deduce(Le(X ** 2, X ** 2 + Y ** 2))}
+    sol = Solution(Problem(Le(0, a ** 2 + c)), rules=rules)
+    sol.add_fact(Le(c, c ** 2))
+    sol.deduce()
+    assert c ** 2 in sol.terms # add_square may still pair it with a later term
+
+def test_terms_are_bounded():
+    sol = Solution(Problem(Le(0, a ** 2 + b ** 2 + c ** 2)), max_terms=8)
+    for var in (a, b, c):
+        sol.add_term(var ** 2)
+    sol.deduce()
+    assert len(sol.terms) <= 8
+
+def test_garbage_is_collected_only_when_terms_became_spent():
+    vars = [Var(name) for name in 'abcdefgh']
+    sol = Solution(Problem(Le(0, a ** 2 + b ** 2)), max_terms=10)
+    for var in vars:
+        sol.add_term(var ** 2)
+    collections = []
+    collect_garbage = sol.collect_garbage
+    sol.collect_garbage = lambda: collections.append(1) or collect_garbage()
+    sol.deduce()
+    assert len(collections) <= 2
+    assert sum(term.key() not in sol.pinned for term in sol.terms) <= 10 # pinned terms may exceed max_terms